@@ -1,4 +1,5 @@
 import os
+import re
 import asyncio
 from langchain_openai import AzureChatOpenAI
 from langgraph.prebuilt import create_react_agent
@@ -6,7 +7,7 @@ from langgraph_supervisor import create_supervisor
 from langchain_mcp_adapters.client import MultiServerMCPClient
 from dotenv import load_dotenv
 # from opentelemetry import trace
-from phoenix.otel import register
+from utils.tracing import get_tracer_provider
 
 load_dotenv()
 
@@ -20,52 +21,72 @@ llm = AzureChatOpenAI(
 
 client = MultiServerMCPClient(
     {
+        # Long-running servers, start them once with `uv run servers/<server>.py`
         "math": {
-            "command": "uv",
-            "args": ["run", "servers/server_math.py"],
-            "transport": "stdio",
+            "url": "http://127.0.0.1:8765/mcp",
+            "transport": "streamable_http",
         },
         "mindat_query_generation": {
-            "command": "uv",
-            "args": ["run", "servers/server_mindat_query_generation.py"],
-            "transport": "stdio",
+            "url": "http://127.0.0.1:8766/mcp",
+            "transport": "streamable_http",
         }
     }
 )
 
+# System prompts of the agents and the supervisor
+MATH_AGENT_PROMPT = "You are a math agent that performs arithmetic calculations. You can use tools of multiply, add, and divide to perform calculations."
+
+MINDAT_AGENT_PROMPT = "You are a mindat agent that can generate search query parameters for mineral entities in mindat database with the tools. You MUST return the raw json results from the tool without any additional explanation or text."
+
+SUPERVISOR_PROMPT = (
+    "You are a team supervisor managing a geological data processing pipeline with the agents."
+    "For user requests involving mineral data queries, always delegate to mindat_query_generation_agent and return its raw results in json."
+    "You should respond to the user requests by delegating tasks to the appropriate agents, and terminate when the tasks are completed or invalid."
+    "AGENTS:"
+    "- math_agent: For mathematical calculations"
+    "- mindat_query_generation_agent: For mineral entity queries, will generate structured search parameters for querying the mindat database."
+)
+
 
 # async main function
 async def main():
     
-    # Initialize Phoenix tracer
-    tracer_provider = register(
-        project_name="mindat_ai_setup",
-        auto_instrument=True,
-        batch=True,
-        protocol="http/protobuf", # mute the warning about default protocol
+    # Initialize Phoenix tracer in a worker thread while the mcp servers handshake concurrently.
+    # Instrumentation is in place before any agent is built or invoked.
+    # Traces are flushed at process exit by get_tracer_provider.
+    _, math_server_tools, mindat_server_tools = await asyncio.gather(
+        asyncio.to_thread(get_tracer_provider),
+        client.get_tools(server_name="math"),
+        client.get_tools(server_name="mindat_query_generation"),
     )
+    tools = math_server_tools + mindat_server_tools
     
-    # Get mcp client tools
-    tools = await client.get_tools()
+    # Index tools by name once, shared by every agent's filter
+    tool_index = {t.name: t for t in tools}
     
-    def filter_tools(tools, keywords):
-        return [t for t in tools if any(k in t.name for k in keywords)]
+    def filter_tools(keywords):
+        # Exact names resolve in O(1); fall back to one precompiled substring regex
+        exact = [tool_index[k] for k in keywords if k in tool_index]
+        if len(exact) == len(keywords):
+            return exact
+        pattern = re.compile("|".join(map(re.escape, keywords)))
+        return [t for name, t in tool_index.items() if pattern.search(name)]
     
-    math_tools = filter_tools(tools, ["multiply", "add", "divide"])
-    mindat_tools = filter_tools(tools, ["query_generation_tool"])
+    math_tools = filter_tools(("multiply", "add", "divide"))
+    mindat_tools = filter_tools(("query_generation_tool",))
 
     math_agent = create_react_agent(
         model=llm,
         tools=math_tools,
         name="math_agent",
-        prompt="You are a math agent that performs arithmetic calculations. You can use tools of multiply, add, and divide to perform calculations.",
+        prompt=MATH_AGENT_PROMPT,
     )
     
     mindat_agent = create_react_agent(
         model=llm,
         tools=mindat_tools,
         name="mindat_query_generation_agent",
-        prompt="You are a mindat agent that can generate search query parameters for mineral entities in mindat database with the tools. You MUST return the raw json results from the tool without any additional explanation or text.",
+        prompt=MINDAT_AGENT_PROMPT,
     )
     
 
@@ -73,14 +94,7 @@ async def main():
     workflow = create_supervisor(
         [math_agent, mindat_agent],
         model=llm,
-        prompt=(
-            "You are a team supervisor managing a geological data processing pipeline with the agents."
-            "For user requests involving mineral data queries, always delegate to mindat_query_generation_agent and return its raw results in json."
-            "You should respond to the user requests by delegating tasks to the appropriate agents, and terminate when the tasks are completed or invalid."
-            "AGENTS:"
-            "- math_agent: For mathematical calculations"
-            "- mindat_query_generation_agent: For mineral entity queries, will generate structured search parameters for querying the mindat database."
-        ),
+        prompt=SUPERVISOR_PROMPT,
     )
     
     # Compile and run
@@ -100,16 +114,6 @@ async def main():
 
     for m in result["messages"]:
         m.pretty_print()
-        
-    # Ensure all phoenix traces are sent before shutdown
-    # Explicit cleanup at the end of main
-    if hasattr(tracer_provider, 'force_flush'):
-        success = tracer_provider.force_flush(timeout_millis=30000)
-
-    
-    # Only shutdown if this is truly the end
-    if hasattr(tracer_provider, 'shutdown'):
-        tracer_provider.shutdown()
 
 
 
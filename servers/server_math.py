@@ -1,36 +1,36 @@
 from mcp.server.fastmcp import FastMCP
 from opentelemetry import trace
-import time
 from dotenv import load_dotenv
-from phoenix.otel import register
+import sys
+from pathlib import Path
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.tracing import get_tracer_provider
 
 load_dotenv()
 
-mcp = FastMCP("Math_test")
-tracer_provider = register(
-    project_name="mindat_ai_setup", 
-    auto_instrument=True,
-    batch=True
-)
+mcp = FastMCP("Math_test", host="127.0.0.1", port=8765)
 
-tracer = tracer_provider.get_tracer(__name__)
+# Needed at import time by the @tracer.tool decorator, registration itself happens once per process
+tracer = get_tracer_provider().get_tracer(__name__)
 
 @mcp.tool()
 @tracer.tool(name= __name__ + ".add") 
 def add(a: int, b: int) -> int:
     """Add two numbers"""
-    with tracer.start_as_current_span(
-        "add_tool_span"
-    ) as span:
-        time.sleep(0.1)  # Simulate some processing time
-        span.set_attribute("component", "math_tool")
-        span.set_attribute("operation", "add")
-        span.set_attribute("input_a", a)
-        span.set_attribute("input_b", b)
-        result = a + b
-        span.set_attribute("result", result)
-        return result
-    # return a + b
+    result = a + b
+    # Annotate the span created by @tracer.tool instead of opening a nested one
+    trace.get_current_span().set_attributes({
+        "component": "math_tool",
+        "operation": "add",
+        "input_a": a,
+        "input_b": b,
+        "result": result,
+    })
+    return result
 
 @mcp.tool()
 def multiply(a: int, b: int) -> int:
@@ -43,4 +43,4 @@ def divide(a: int, b: int) -> float:
     return a / b
 
 if __name__ == "__main__":
-    mcp.run(transport="stdio")
\ No newline at end of file
+    mcp.run(transport="streamable-http")
\ No newline at end of file
@@ -1,17 +1,17 @@
 import os
 from mcp.server.fastmcp import FastMCP
-from opentelemetry import trace
-import time
 from dotenv import load_dotenv
-from phoenix.otel import register
 from langchain_openai import AzureChatOpenAI
 import asyncio
+import functools
+import hashlib
+import httpx
+import openai
 import json
-import ast
-from typing import Annotated, List, Tuple, Union, Optional, Type, Any, Dict
-from pydantic import BaseModel, Field
-from langchain_core.output_parsers import PydanticOutputParser
-from openmindat import GeomaterialRetriever
+import random
+from typing import List, Union, Optional, Type, Any, Dict, Tuple, get_args, get_origin, get_type_hints
+from langchain_core.messages import HumanMessage
+from langchain_core.prompts import ChatPromptTemplate
 from collections import Counter
 import sys
 from pathlib import Path
@@ -20,95 +20,201 @@ from pathlib import Path
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
+from utils.llm_cache import StructuredResponseCache
+from utils.mindat_schema_manager import get_schema_manager
+from utils.tracing import get_tracer_provider
 from utils.validation_pipeline import ValidationPipeline, MindatQueryDict
 
 
 load_dotenv(override=True)
 
-mcp = FastMCP("mindat_query_generation_server")
+mcp = FastMCP("mindat_query_generation_server", host="127.0.0.1", port=8766)
 
-tracer_provider = register(
-    project_name="mindat_ai_setup", 
-    auto_instrument=True,
-    batch=True
+# Static prompts, kept byte-identical across calls so the provider can cache the prefix
+_SYSTEM_PROMPT = (
+    "You are a helpful assistant that generates structured search parameters for querying the mindat database. "
+    "If user specify the hardness value (e.g., hardness of 7), set both hardness_min and hardness_max to that value. "
+    "If user specify a hardness range (e.g., larger than 6), set hardness_min = 6, avoid setting it like hardness_min = 6.01. Same for hardness_max."
 )
+_HUMAN_PROMPT = "Given the user input: '{user_input}', generate a JSON object with the following fields: "
+_PROMPT_TEMPLATE = ChatPromptTemplate.from_messages([
+    ("system", _SYSTEM_PROMPT),
+    ("human", _HUMAN_PROMPT),
+])
 
-tracer = tracer_provider.get_tracer(__name__)
+# Part of every response cache key, bump it when the rules or output handling change
+# in a way that should invalidate the stored answers
+_CACHE_VERSION = "2"
 
+# Upper bound for a single structured LLM call, so a hung request can't stall the whole consensus round
+_LLM_TIMEOUT_SECONDS = 30
+
+
+def _get_status_code(exc: Exception) -> Optional[int]:
+    """HTTP status of a failed LLM call, or None if the failure wasn't an HTTP error response."""
+    # openai.APIStatusError exposes status_code, httpx.HTTPStatusError exposes response
+    status_code = getattr(exc, "status_code", None)
+    if status_code is None and isinstance(exc, httpx.HTTPStatusError):
+        status_code = exc.response.status_code
+    return status_code
+
+
+def _is_transient(exc: Exception) -> bool:
+    """Whether an LLM call failure is transient (timeout, network, 429, 5xx) and worth backing off for."""
+    # openai.APIConnectionError (incl. APITimeoutError) carries no status but is a network failure
+    if isinstance(exc, (TimeoutError, httpx.TransportError, openai.APIConnectionError)):
+        return True
+    
+    status_code = _get_status_code(exc)
+    return status_code is not None and (status_code == 429 or status_code >= 500)
+
+
+def _canon_hash(result: dict) -> bytes:
+    """Hash a generated result in canonical (sorted, compact) JSON form for consensus counting."""
+    canonical = json.dumps(result, sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(canonical.encode(), digest_size=16).digest()
+
+
+@functools.lru_cache(maxsize=None)
+def _field_types(schema: Type) -> Dict[str, Tuple[Any, type, Optional[type]]]:
+    """Map each field of a TypedDict schema to (annotation, runtime type, list item type), unwrapping Optional."""
+    field_types = {}
+    for name, hint in get_type_hints(schema).items():
+        inner = hint
+        if get_origin(hint) is Union:
+            inner = next(arg for arg in get_args(hint) if arg is not type(None))
+        runtime_type = get_origin(inner) or inner
+        item_type = get_args(inner)[0] if runtime_type is list and get_args(inner) else None
+        field_types[name] = (hint, runtime_type, item_type)
+    return field_types
+
+
+def _check_field_types(schema: Type, params: dict) -> dict:
+    """
+    Check a TypedDict generation against the schema's field types.
+    Unlike a Pydantic model, a TypedDict schema isn't validated at runtime, so a mismatch
+    raises TypeError here and the attempt is retried with error feedback.
+    Integers are widened to float, so 5 and 5.0 compare equal for consensus.
+    """
+    checked = dict(params)
+    for name, (hint, runtime_type, item_type) in _field_types(schema).items():
+        value = checked.get(name)
+        if value is None:
+            continue
+        if runtime_type is float and isinstance(value, int) and not isinstance(value, bool):
+            checked[name] = value = float(value)
+        if not isinstance(value, runtime_type) or (
+            item_type is not None and not all(isinstance(item, item_type) for item in value)
+        ):
+            raise TypeError(f"Field '{name}' must be {hint}, got {value!r}")
+    return checked
+
+
+@functools.lru_cache(maxsize=1)
+def _get_llm_cache() -> StructuredResponseCache:
+    """
+    Open the shared response cache on first use, so importing the module has no filesystem side effects.
+    Repeated queries skip the Azure round-trip, only answers that passed validation are stored.
+    """
+    database_path = os.getenv("MINDAT_LLM_CACHE_PATH", str(project_root / "data" / "mindat_llm_cache.db"))
+    return StructuredResponseCache(database_path=database_path)
+
+
+@functools.lru_cache(maxsize=1)
+def _get_llm() -> AzureChatOpenAI:
+    """Initialize the shared Azure OpenAI client with proper error handling."""
+    try:
+        required_env_vars = [
+            "AZURE_DEPLOYMENT_NAME",
+            "AZURE_OPENAI_API_VERSION", 
+            "AZURE_OPENAI_API_ENDPOINT",
+            "AZURE_OPENAI_API_KEY"
+        ]
+        
+        missing_vars = [var for var in required_env_vars if not os.getenv(var)]
+        if missing_vars:
+            raise ValueError(f"Missing required environment variables: {missing_vars}")
+        
+        return AzureChatOpenAI(
+            deployment_name=os.getenv("AZURE_DEPLOYMENT_NAME"),
+            api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
+            azure_endpoint=os.getenv("AZURE_OPENAI_API_ENDPOINT"),
+            api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+            temperature=0.3,
+            # Keep-alive pool shared by the concurrent generations and validators
+            http_async_client=httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
+            ),
+        )
+    except Exception as e:
+        raise RuntimeError("Failed to initialize AzureChatOpenAI client") from e
+
+
+@functools.lru_cache(maxsize=None)
+def _structured_for(pydantic_model: Type):
+    """Bind the shared LLM to a structured output schema (Pydantic model or TypedDict) once per output model."""
+    return _get_llm().with_structured_output(pydantic_model)
 
     
 class ParamGeneration:
     def __init__(
         self,
         user_input: str,
-        pydantic_model: Optional[Type[BaseModel]],
+        pydantic_model: Optional[Type],
         num_generations: int = 1, # number of generations to check for consistency, should be 1 or 3
     ) -> None:
         self.user_input = user_input
-        llm = self._initialize_llm()
-        self.structured_llm = llm.with_structured_output(pydantic_model)
-        self.parser = PydanticOutputParser(pydantic_object=MindatQueryDict)
+        self.pydantic_model = pydantic_model
+        self.model_name = pydantic_model.__name__
+        llm = _get_llm()
+        self.structured_llm = _structured_for(pydantic_model)
         self.num_generations = num_generations
+        self.messages = _PROMPT_TEMPLATE.format_messages(user_input=user_input)
+        # Cache key over the normalized user input, output model, generation mode, prompts,
+        # and the cache and schema versions, so rule or schema changes don't replay stale answers
+        self.cache_key = StructuredResponseCache.make_key(
+            user_input.strip().lower(),
+            self.model_name,
+            str(num_generations),
+            _SYSTEM_PROMPT,
+            _HUMAN_PROMPT,
+            _CACHE_VERSION,
+            get_schema_manager().schema_version()
+        )
         # Initialize ValidationPipeline with LLM
         self.validation_pipeline = ValidationPipeline(llm)
 
-    def _initialize_llm(self) -> AzureChatOpenAI:
-            """Initialize the Azure OpenAI client with proper error handling."""
-            try:
-                required_env_vars = [
-                    "AZURE_DEPLOYMENT_NAME",
-                    "AZURE_OPENAI_API_VERSION", 
-                    "AZURE_OPENAI_API_ENDPOINT",
-                    "AZURE_OPENAI_API_KEY"
-                ]
-                
-                missing_vars = [var for var in required_env_vars if not os.getenv(var)]
-                if missing_vars:
-                    raise ValueError(f"Missing required environment variables: {missing_vars}")
-                
-                return AzureChatOpenAI(
-                    deployment_name=os.getenv("AZURE_DEPLOYMENT_NAME"),
-                    api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
-                    azure_endpoint=os.getenv("AZURE_OPENAI_API_ENDPOINT"),
-                    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-                    temperature=0.3,
-                )
-            except Exception as e:
-                raise RuntimeError("Failed to initialize AzureChatOpenAI client") from e
-
-
     async def _generate_once(self) -> dict:
-        system_prompt = (
-            "You are a helpful assistant that generates structured search parameters for querying the mindat database. "
-            "If user specify the hardness value (e.g., hardness of 7), set both hardness_min and hardness_max to that value. "
-            "If user specify a hardness range (e.g., larger than 6), set hardness_min = 6, avoid setting it like hardness_min = 6.01. Same for hardness_max."
-            )
-        base_human_prompt = (
-            f"Given the user input: '{self.user_input}', generate a JSON object with the following fields: "
-            )
         structured_llm = self.structured_llm
         last_exception = None
         
         for attempt in range(3):
             try:
-                # Build human prompt with error feedback from previous attempt
+                # Append error feedback from previous attempt, keeping the base prompt as the prefix
                 if last_exception and attempt > 0:
-                    human_prompt = (
-                        f"{base_human_prompt}\n\n"
+                    messages = self.messages + [HumanMessage(content=(
                         f"IMPORTANT: Previous attempt #{attempt} failed with the following error:\n"
                         f"Error type: {type(last_exception).__name__}\n"
                         f"Error message: {str(last_exception)}\n"
                         f"Please fix the issue and generate a valid response."
-                    )
+                    ))]
                 else:
-                    human_prompt = base_human_prompt
+                    messages = self.messages
                 
-                structured_response = await structured_llm.ainvoke([
-                    ("system", system_prompt),
-                    ("human", human_prompt)
-                ])
+                try:
+                    structured_response = await asyncio.wait_for(
+                        structured_llm.ainvoke(messages),
+                        timeout=_LLM_TIMEOUT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    raise TimeoutError(f"LLM call timed out after {_LLM_TIMEOUT_SECONDS}s") from None
                 
-                return structured_response.model_dump()
+                # TypedDict schemas already come back as dicts but unchecked, Pydantic models need dumping
+                if isinstance(structured_response, dict):
+                    params = _check_field_types(self.pydantic_model, structured_response)
+                else:
+                    params = structured_response.model_dump()
+                return params
                 
             except Exception as e:
                 last_exception = e
@@ -117,6 +223,15 @@ class ParamGeneration:
                 if attempt == 2:
                     return {"error message": "Error after 3 attempts: " + str(last_exception)}
                 
+                # Client errors (auth, bad request, content filter) won't succeed on retry
+                if _get_status_code(e) is not None and not _is_transient(e):
+                    return {"error message": f"Error after {attempt + 1} attempts: " + str(last_exception)}
+                
+                # Back off with jitter on transient failures,
+                # malformed outputs are retried immediately with error feedback
+                if _is_transient(e):
+                    await asyncio.sleep(min(8, 0.5 * (2 ** attempt)) + random.random() * 0.2)
+                
                 # Otherwise continue to next attempt
                 continue
         
@@ -133,6 +248,12 @@ class ParamGeneration:
                     On validation failure: [validation_result] (full validation result with status and issues)
                     On consensus failure: [{"consensus_failed": True, "candidates": [...], "message": "..."}]
         """
+        # A previous answer that passed validation is replayed as-is, SQLite I/O stays off the loop
+        llm_cache = _get_llm_cache()
+        cached = await asyncio.to_thread(llm_cache.get, self.cache_key)
+        if cached is not None:
+            return [cached]
+        
         if self.num_generations == 1:
             params = await self._generate_once()
             # Validate the single generation result
@@ -142,7 +263,9 @@ class ParamGeneration:
             )
             # If validation passed, return only corrected_params
             if validation_result.get("status") == "valid":
-                return [validation_result.get("corrected_params", params)]
+                corrected_params = validation_result.get("corrected_params", params)
+                await asyncio.to_thread(llm_cache.put, self.cache_key, corrected_params)
+                return [corrected_params]
             # If validation failed, return the full validation result
             return [validation_result]
         
@@ -158,16 +281,40 @@ class ParamGeneration:
                     "generation_index": index + 1
                 }
         
+        async def generate_batch(indices: range, kept: List[dict]) -> List[dict]:
+            results = list(kept)
+            counts = Counter(
+                _canon_hash(r) for r in kept if "error message" not in r
+            )
+            tasks = [asyncio.create_task(safe_generate(i)) for i in indices]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    result = await next_done
+                    results.append(result)
+                    if "error message" in result:
+                        continue
+                    
+                    # Stop as soon as 2 generations agree instead of waiting for the slowest one
+                    result_hash = _canon_hash(result)
+                    counts[result_hash] += 1
+                    if counts[result_hash] >= 2:
+                        break
+            finally:
+                pending = [task for task in tasks if not task.done()]
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+            return results
+        
         max_consensus_attempts = 3
         
+        results = await generate_batch(range(self.num_generations), [])
+        
         for attempt in range(max_consensus_attempts):
-            async with asyncio.TaskGroup() as tg:
-                tasks = [
-                    tg.create_task(safe_generate(i))
-                    for i in range(self.num_generations)
-                ]
-            
-            results = [task.result() for task in tasks]
+            if attempt > 0:
+                # Keep the largest agreeing group and only re-roll the minority
+                majority = self._get_majority_group(results)
+                results = await generate_batch(range(len(majority), self.num_generations), majority)
             
             consensus = self._get_consensus(results)
             
@@ -179,13 +326,12 @@ class ParamGeneration:
                 )
                 # If validation passed, return only corrected_params
                 if validation_result.get("status") == "valid":
-                    return [validation_result.get("corrected_params", consensus)]
+                    corrected_params = validation_result.get("corrected_params", consensus)
+                    await asyncio.to_thread(llm_cache.put, self.cache_key, corrected_params)
+                    return [corrected_params]
                 # If validation failed, return the full validation result
                 return [validation_result]
             
-            if attempt < max_consensus_attempts - 1:
-                continue
-        
         # Consensus failed
         valid_candidates = [r for r in results if "error message" not in r]
         
@@ -219,31 +365,49 @@ class ParamGeneration:
         if len(valid_results) < 2:
             return False
         
-        # Convert dicts to JSON strings for comparison
-        # Use sort_keys=True to ensure consistent ordering
-        json_strings = [json.dumps(r, sort_keys=True) for r in valid_results]
+        # Hash each dict once in canonical form for comparison
+        hashes = [_canon_hash(r) for r in valid_results]
         
         # Count occurrences of each unique result
-        counts = Counter(json_strings)
+        counts = Counter(hashes)
         
         # Get the most common result and its count
-        most_common_json, count = counts.most_common(1)[0]
+        most_common_hash, count = counts.most_common(1)[0]
         
         # Return consensus if at least 2 results match
         if count >= 2:
-            return json.loads(most_common_json)
+            return valid_results[hashes.index(most_common_hash)]
         else:
             return False
+    
+    def _get_majority_group(self, results: List[dict]) -> List[dict]:
+        """
+        Get the largest group of identical valid results.
+        
+        Args:
+            results: List of generated JSON objects
+        
+        Returns:
+            List[dict]: Results in the most common group (empty if none are valid).
+                        The remaining generations are the minority to be re-rolled.
+        """
+        valid_results = [r for r in results if "error message" not in r]
+        if not valid_results:
+            return []
+        
+        hashes = [_canon_hash(r) for r in valid_results]
+        most_common_hash, _ = Counter(hashes).most_common(1)[0]
+        
+        return [r for r, h in zip(valid_results, hashes) if h == most_common_hash]
 
 
 
 
-@mcp.tool()
-async def query_generation_tool(user_input: str) -> List[dict]:
-    """
-    Generate structured search parameters for querying the mindat database based on user input.
-    Please return with the raw json results.
-    """
+# In-flight generations keyed by normalized user input (single-flight)
+_in_flight: Dict[str, asyncio.Task] = {}
+
+
+async def _generate_query(user_input: str) -> List[dict]:
     mindat_querist = ParamGeneration(
         user_input=user_input,
         pydantic_model=MindatQueryDict,
@@ -253,8 +417,30 @@ async def query_generation_tool(user_input: str) -> List[dict]:
     return response
 
 
+@mcp.tool()
+async def query_generation_tool(user_input: str) -> List[dict]:
+    """
+    Generate structured search parameters for querying the mindat database based on user input.
+    Please return with the raw json results.
+    """
+    # Identical concurrent requests await the generation already running instead of starting a new one
+    key = user_input.strip().lower()
+    task = _in_flight.get(key)
+    if task is None:
+        task = asyncio.create_task(_generate_query(user_input))
+        _in_flight[key] = task
+        task.add_done_callback(lambda _: _in_flight.pop(key, None))
+    
+    # Shield so one cancelled caller doesn't cancel the generation for the others
+    return await asyncio.shield(task)
+
+
 if __name__ == "__main__":
-    mcp.run(transport="stdio")
+    # Register tracing (and its auto-instrumentation) before serving, not inside a request
+    get_tracer_provider()
+    # Warm the schema manager so the first request doesn't read or parse the schema docs
+    get_schema_manager().get_geomaterials_endpoint()
+    mcp.run(transport="streamable-http")
     
     # user_input = "Query the ima-approved mineral species with hardness between 3-5, in Hexagonal crystal system, must have Neodymium, but without sulfur"
     
@@ -0,0 +1,50 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.llm_cache import StructuredResponseCache
+
+
+class StructuredResponseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.database_path = os.path.join(tmp_dir.name, "nested", "cache.db")
+
+    def test_entries_persist_across_instances(self):
+        StructuredResponseCache(database_path=self.database_path).put("k", {"el_inc": "Fe"})
+        self.assertEqual(StructuredResponseCache(database_path=self.database_path).get("k"), {"el_inc": "Fe"})
+
+    def test_entries_expire(self):
+        cache = StructuredResponseCache(database_path=self.database_path, ttl=60)
+        cache.put("k", {"el_inc": "Fe"})
+        with mock.patch("utils.llm_cache.time.time", return_value=time.time() + 61):
+            self.assertIsNone(cache.get("k"))
+            self.assertIsNone(StructuredResponseCache(database_path=self.database_path, ttl=60).get("k"))
+
+    def test_lru_evicts_oldest_in_memory_entry(self):
+        cache = StructuredResponseCache(database_path=self.database_path, maxsize=1)
+        cache.put("a", {"v": 1})
+        cache.put("b", {"v": 2})
+        self.assertEqual(list(cache._memory), ["b"])
+        # Still served from SQLite
+        self.assertEqual(cache.get("a"), {"v": 1})
+
+    def test_returned_values_are_copies(self):
+        cache = StructuredResponseCache(database_path=self.database_path)
+        cache.put("k", {"v": 1})
+        cache.get("k")["v"] = 2
+        self.assertEqual(cache.get("k"), {"v": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
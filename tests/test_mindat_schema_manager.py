@@ -0,0 +1,246 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import httpx
+import orjson
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils import mindat_schema_manager
+from utils.mindat_schema_manager import MindatAPISchemaManager
+
+
+def _schema_yaml(*param_names: str) -> str:
+    """Minimal OpenAPI document with the given /v1/geomaterials/ parameters"""
+    params = "".join(
+        f"        - name: {name}\n          description: {name} doc\n          schema: {{type: string}}\n"
+        for name in param_names
+    )
+    return f"paths:\n  /v1/geomaterials/:\n    get:\n      parameters:\n{params}"
+
+
+class _SchemaTestCase(unittest.TestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.schema_path = os.path.join(tmp_dir.name, "Mindat_API.yaml")
+
+    def _write_schema(self, *param_names: str, mtime: float = None):
+        with open(self.schema_path, "w", encoding="utf-8") as f:
+            f.write(_schema_yaml(*param_names))
+        if mtime is not None:
+            os.utime(self.schema_path, (mtime, mtime))
+
+    def _manager(self) -> MindatAPISchemaManager:
+        return MindatAPISchemaManager(schema_url="https://schema.test/", schema_path=self.schema_path)
+
+
+class PersistedDocsTest(_SchemaTestCase):
+
+    def test_extracted_docs_are_persisted(self):
+        self._write_schema("ima", "el_inc", mtime=1_000_000)
+        docs = self._manager().get_geomaterials_endpoint()
+
+        manager = self._manager()
+        with open(manager.geomaterials_docs_path, "rb") as f:
+            self.assertEqual(orjson.loads(f.read()), docs)
+
+    def test_fresh_docs_skip_the_yaml_parse(self):
+        self._write_schema("ima", mtime=1_000_000)
+        docs = self._manager().get_geomaterials_endpoint()
+
+        with mock.patch.object(mindat_schema_manager.yaml, "load", side_effect=AssertionError("schema parsed")):
+            manager = self._manager()
+            self.assertEqual(manager.get_geomaterials_endpoint(), docs)
+        self.assertIsNone(manager.schema_data)
+
+    def test_docs_older_than_the_schema_are_rebuilt(self):
+        self._write_schema("ima", mtime=1_000_000)
+        docs_path = self._manager().geomaterials_docs_path
+        self._manager().get_geomaterials_endpoint()
+        os.utime(docs_path, (1_000_000, 1_000_000))
+
+        self._write_schema("el_inc", mtime=2_000_000)
+        self.assertEqual(list(self._manager().get_geomaterials_endpoint()), ["el_inc"])
+
+    def test_corrupt_docs_fall_back_to_the_schema(self):
+        self._write_schema("ima", mtime=1_000_000)
+        manager = self._manager()
+        with open(manager.geomaterials_docs_path, "wb") as f:
+            f.write(b"{not json")
+
+        with mock.patch("builtins.print"):
+            self.assertEqual(list(self._manager().get_geomaterials_endpoint()), ["ima"])
+
+
+class RefreshSchemaTest(_SchemaTestCase):
+
+    def test_unchanged_schema_keeps_docs(self):
+        self._write_schema("ima")
+        manager = self._manager()
+        docs = manager.get_geomaterials_endpoint()
+
+        async def not_modified():
+            return True
+
+        with mock.patch.object(manager, "download_schema_async", side_effect=not_modified) as download:
+            async def refresh_twice():
+                await manager.refresh_schema_async()
+                await manager.refresh_schema_async()
+            asyncio.run(refresh_twice())
+
+        self.assertEqual(download.call_count, 1)
+        self.assertIs(manager.get_geomaterials_endpoint(), docs)
+
+    def test_changed_schema_rebuilds_docs(self):
+        self._write_schema("ima", mtime=1_000_000)
+        manager = self._manager()
+        self.assertEqual(list(manager.get_geomaterials_endpoint()), ["ima"])
+
+        async def new_schema():
+            self._write_schema("el_inc")
+            return True
+
+        with mock.patch.object(manager, "download_schema_async", side_effect=new_schema):
+            self.assertTrue(asyncio.run(manager.refresh_schema_async()))
+
+        self.assertEqual(list(manager.get_geomaterials_endpoint()), ["el_inc"])
+
+    def test_concurrent_refreshes_share_one_download(self):
+        self._write_schema("ima")
+        manager = self._manager()
+
+        async def slow_not_modified():
+            await asyncio.sleep(0.01)
+            return True
+
+        with mock.patch.object(manager, "download_schema_async", side_effect=slow_not_modified) as download:
+            async def refresh_concurrently():
+                return await asyncio.gather(*(manager.refresh_schema_async() for _ in range(3)))
+            self.assertEqual(asyncio.run(refresh_concurrently()), [True, True, True])
+
+        self.assertEqual(download.call_count, 1)
+
+    def test_background_refresh_serves_local_copy(self):
+        self._write_schema("ima")
+        manager = self._manager()
+        release = None
+
+        async def blocked_download():
+            await release.wait()
+            return True
+
+        async def run():
+            nonlocal release
+            release = asyncio.Event()
+            with mock.patch.object(manager, "download_schema_async", side_effect=blocked_download):
+                task = manager.start_schema_refresh()
+                self.assertIs(manager.start_schema_refresh(), task)
+                await asyncio.sleep(0)
+                # The refresh is still waiting on the network, the local docs are served meanwhile
+                self.assertFalse(task.done())
+                self.assertEqual(list(manager.get_geomaterials_endpoint()), ["ima"])
+                release.set()
+                self.assertTrue(await task)
+
+        asyncio.run(run())
+
+    def test_sync_download_refuses_running_loop(self):
+        manager = self._manager()
+
+        async def call_sync():
+            manager.download_schema()
+
+        with self.assertRaises(RuntimeError):
+            asyncio.run(call_sync())
+
+
+class ParamsInfoJsonTest(_SchemaTestCase):
+
+    def test_matches_prompt_serialization_of_params_info(self):
+        with open(self.schema_path, "w", encoding="utf-8") as f:
+            f.write(
+                _schema_yaml("ima", "el_inc")
+                + "        - name: crystal_system\n"
+                + "          description: \"multi\\nline\"\n"
+                + "          schema: {type: array, items: {type: string, enum: [Hexagonal, Trigonal]}}\n"
+            )
+        manager = self._manager()
+        option = orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS
+
+        for param_names in (
+            ["ima", "el_inc", "crystal_system"],
+            ["crystal_system", "unknown"],
+            ["unknown"],
+            [],
+        ):
+            with self.subTest(param_names=param_names):
+                expected = orjson.dumps(manager.get_params_info(param_names), option=option)
+                self.assertEqual(manager.get_params_info_json(param_names), expected)
+                # Served from the per-parameter cache the second time
+                self.assertEqual(manager.get_params_info_json(param_names), expected)
+
+
+class DownloadSchemaTest(_SchemaTestCase):
+
+    def _download(self, manager: MindatAPISchemaManager, handler) -> bool:
+        real_client = httpx.AsyncClient
+        with mock.patch.object(
+            mindat_schema_manager.httpx,
+            "AsyncClient",
+            lambda **kwargs: real_client(transport=httpx.MockTransport(handler), **kwargs),
+        ):
+            return asyncio.run(manager.download_schema_async())
+
+    def test_not_modified_keeps_local_copy(self):
+        self._write_schema("ima")
+        manager = self._manager()
+        with open(manager.etag_path, "w", encoding="utf-8") as f:
+            f.write('"v1"')
+        seen_headers = {}
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            seen_headers.update(request.headers)
+            return httpx.Response(304)
+
+        self.assertTrue(self._download(manager, handler))
+        self.assertEqual(seen_headers.get("if-none-match"), '"v1"')
+        self.assertIn("if-modified-since", seen_headers)
+        with open(self.schema_path, encoding="utf-8") as f:
+            self.assertEqual(f.read(), _schema_yaml("ima"))
+
+    def test_new_schema_without_etag_drops_stale_etag(self):
+        self._write_schema("ima")
+        manager = self._manager()
+        with open(manager.etag_path, "w", encoding="utf-8") as f:
+            f.write('"v1"')
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(200, content=_schema_yaml("el_inc").encode())
+
+        self.assertTrue(self._download(manager, handler))
+        self.assertFalse(os.path.exists(manager.etag_path))
+        with open(self.schema_path, encoding="utf-8") as f:
+            self.assertEqual(f.read(), _schema_yaml("el_inc"))
+
+    def test_new_schema_stores_etag(self):
+        manager = self._manager()
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(200, content=_schema_yaml("ima").encode(), headers={"ETag": '"v2"'})
+
+        self.assertTrue(self._download(manager, handler))
+        with open(manager.etag_path, encoding="utf-8") as f:
+            self.assertEqual(f.read(), '"v2"')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import asyncio
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils import model_validator
+from utils.llm_cache import TTLCache
+from utils.model_validator import ModelValidator
+
+
+class _Reply:
+    def __init__(self, content):
+        self.content = content
+
+
+class _StubLLM:
+    """Chat model stand-in that answers every prompt with the same raw content"""
+
+    def __init__(self, content):
+        self.content = content
+        self.calls = 0
+
+    def bind(self, **kwargs):
+        return self
+
+    async def ainvoke(self, prompt):
+        self.calls += 1
+        return _Reply(self.content)
+
+
+class StripCodeFenceTest(unittest.TestCase):
+
+    def test_fenced_json(self):
+        self.assertEqual(
+            ModelValidator._strip_code_fence('```json\n{"status": "valid"}\n```'),
+            '{"status": "valid"}'
+        )
+
+    def test_bare_fence_and_padding(self):
+        self.assertEqual(ModelValidator._strip_code_fence('  ```\n{}\n```  '), '{}')
+
+    def test_unfenced_text_is_kept(self):
+        self.assertEqual(ModelValidator._strip_code_fence(' {"status": "valid"} '), '{"status": "valid"}')
+
+    def test_non_string_content(self):
+        self.assertEqual(ModelValidator._strip_code_fence([{"type": "text"}]), "")
+
+
+class ParseRawOutputTest(unittest.TestCase):
+
+    def test_valid_without_issues(self):
+        self.assertEqual(ModelValidator._parse_raw_output('{"status": "valid"}'), ("valid", {}))
+
+    def test_status_casing(self):
+        self.assertEqual(
+            ModelValidator._parse_raw_output('{"status": "Invalid", "issues": {"el_exc": "missing"}}'),
+            ("invalid", {"el_exc": "missing"})
+        )
+
+    def test_reasons_are_stringified(self):
+        self.assertEqual(
+            ModelValidator._parse_raw_output('{"status": "invalid", "issues": {"hardness_min": 7}}'),
+            ("invalid", {"hardness_min": "7"})
+        )
+
+    def test_ambiguous_replies(self):
+        for text in (
+            '{"status": "invalid", "issues": ["el_exc"]}',
+            '{"status": "invalid", "issues": "el_exc is missing"}',
+            '{"status": "uncertain"}',
+            '{"issues": {}}',
+            '["valid"]',
+            'The parameters look valid.',
+            '',
+        ):
+            with self.subTest(text=text):
+                self.assertIsNone(ModelValidator._parse_raw_output(text))
+
+
+class ModelValidateTest(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(model_validator, "_validation_cache", TTLCache())
+        self.cache = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _validate(self, content):
+        llm = _StubLLM(content)
+        result = asyncio.run(ModelValidator(llm).model_intent_hallucination_validate(
+            {"el_inc": "Fe"}, "iron minerals without sulfur", {"el_exc": {"name": "el_exc"}}
+        ))
+        return llm, result
+
+    def test_fenced_reply_builds_structured_issues(self):
+        llm, (status, issues) = self._validate('```json\n{"status": "Invalid", "issues": {"el_exc": "missing"}}\n```')
+        self.assertEqual(llm.calls, 1)
+        self.assertEqual(status, "invalid")
+        self.assertEqual(issues, {"el_exc": {"value": None, "reason": "missing", "api_doc": {"name": "el_exc"}}})
+
+    def test_unparseable_reply_is_reported_and_not_cached(self):
+        llm, (status, issues) = self._validate("The parameters look fine.")
+        self.assertEqual(llm.calls, 1)
+        self.assertEqual(status, "invalid")
+        self.assertIn("Unparseable validation reply", issues["_error"]["reason"])
+        self.assertEqual(len(self.cache._data), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
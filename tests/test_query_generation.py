@@ -0,0 +1,132 @@
+import itertools
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from servers import server_mindat_query_generation as server
+from utils.llm_cache import StructuredResponseCache
+from utils.validation_pipeline import MindatQueryDict
+
+
+class _StubLLM:
+    """Structured LLM stand-in that returns the next canned output on every call"""
+
+    def __init__(self, outputs):
+        self.outputs = iter(outputs)
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        return dict(next(self.outputs))
+
+
+class _StubPipeline:
+    """ValidationPipeline stand-in that accepts or rejects every params dict"""
+
+    def __init__(self, status: str):
+        self.status = status
+
+    async def validate(self, params: dict, original_query: str = "") -> dict:
+        if self.status == "valid":
+            return {"status": "valid", "corrected_params": params}
+        return {"status": "invalid", "issues": {"_error": "rejected"}}
+
+
+class ConsensusTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.cache = StructuredResponseCache(database_path=os.path.join(tmp_dir.name, "cache.db"))
+
+        for patcher in (
+            mock.patch.object(server, "_get_llm_cache", return_value=self.cache),
+            mock.patch.object(server, "_get_llm", return_value=None),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _make_generator(self, llm: _StubLLM, status: str = "valid", num_generations: int = 3) -> server.ParamGeneration:
+        with mock.patch.object(server, "_structured_for", return_value=llm), \
+             mock.patch.object(server, "ValidationPipeline", return_value=_StubPipeline(status)):
+            return server.ParamGeneration(
+                user_input="iron minerals",
+                pydantic_model=dict,
+                num_generations=num_generations,
+            )
+
+    async def test_inconsistent_generations_fail_consensus(self):
+        # Every call disagrees, so each re-roll of the minority has to reach the LLM
+        llm = _StubLLM({"el_inc": f"X{i}"} for i in itertools.count())
+        result = await self._make_generator(llm).generate_params()
+
+        self.assertTrue(result[0].get("consensus_failed"))
+        # 3 initial generations, then 2 re-rolled minority generations per extra attempt
+        self.assertEqual(llm.calls, 7)
+        self.assertIsNone(self.cache.get(self._make_generator(llm).cache_key))
+
+    async def test_minority_is_rerolled_until_consensus(self):
+        agreed = {"el_inc": "Fe"}
+        llm = _StubLLM(itertools.chain([agreed, {"el_inc": "Cu"}, {"el_inc": "S"}], itertools.repeat(agreed)))
+        result = await self._make_generator(llm).generate_params()
+
+        self.assertEqual(result, [agreed])
+        self.assertGreater(llm.calls, 3)
+
+        # The validated consensus is replayed without calling the LLM again
+        replay_llm = _StubLLM([])
+        self.assertEqual(await self._make_generator(replay_llm).generate_params(), [agreed])
+        self.assertEqual(replay_llm.calls, 0)
+
+    async def test_rejected_consensus_is_not_cached(self):
+        llm = _StubLLM(itertools.repeat({"el_inc": "Fe"}))
+        result = await self._make_generator(llm, status="invalid").generate_params()
+
+        self.assertEqual(result[0]["status"], "invalid")
+        self.assertIsNone(self.cache.get(self._make_generator(llm).cache_key))
+
+    async def test_single_generation_is_cached_after_validation(self):
+        llm = _StubLLM(itertools.repeat({"el_inc": "Fe"}))
+        self.assertEqual(await self._make_generator(llm, num_generations=1).generate_params(), [{"el_inc": "Fe"}])
+        self.assertEqual(llm.calls, 1)
+
+        # Replayed for the same generation mode only
+        self.assertEqual(await self._make_generator(llm, num_generations=1).generate_params(), [{"el_inc": "Fe"}])
+        self.assertEqual(llm.calls, 1)
+        self.assertIsNone(self.cache.get(self._make_generator(llm).cache_key))
+
+    def test_cache_key_tracks_schema_version(self):
+        llm = _StubLLM([])
+        key = self._make_generator(llm).cache_key
+        with mock.patch.object(server.get_schema_manager(), "schema_version", return_value='"new-etag"'):
+            self.assertNotEqual(self._make_generator(llm).cache_key, key)
+
+
+class FieldTypesTest(unittest.TestCase):
+
+    def test_integers_are_widened_to_float(self):
+        checked = server._check_field_types(MindatQueryDict, {"hardness_min": 5, "hardness_max": None})
+        self.assertEqual(checked, {"hardness_min": 5.0, "hardness_max": None})
+        self.assertIsInstance(checked["hardness_min"], float)
+
+    def test_mistyped_values_raise(self):
+        for params in (
+            {"hardness_min": "5"},
+            {"crystal_system": "Hexagonal"},
+            {"crystal_system": [1]},
+            {"el_inc": ["Fe"]},
+            {"ima": "true"},
+        ):
+            with self.subTest(params=params), self.assertRaises(TypeError):
+                server._check_field_types(MindatQueryDict, params)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import asyncio
+import sys
+import unittest
+from pathlib import Path
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.rule_validator import RuleValidator, _parse_elements_cached
+from utils.validation_pipeline import VALID_FIELDS
+
+
+class ElementParsingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.validator = RuleValidator(VALID_FIELDS)
+
+    def test_parse_strips_whitespace_and_empty_entries(self):
+        self.assertEqual(_parse_elements_cached(" Fe , cu,,Fe ,"), frozenset({"Fe", "cu"}))
+        self.assertEqual(_parse_elements_cached(""), frozenset())
+
+    def test_correct_case_of_mixed_case_symbols(self):
+        self.assertEqual(self.validator._correct_element_case("fe,CU,nD"), "Fe,Cu,Nd")
+        self.assertEqual(self.validator._correct_element_case("oh,h2o,so4"), "OH,H2O,SO4")
+
+    def test_correct_case_strips_whitespace(self):
+        self.assertEqual(self.validator._correct_element_case(" fe ,  cu,, "), "Fe,Cu")
+
+    def test_correct_case_drops_duplicates_keeping_first_occurrence(self):
+        self.assertEqual(self.validator._correct_element_case("Cu,fe,cu,FE,S"), "Cu,Fe,S")
+
+    def test_correct_case_preserves_user_order(self):
+        self.assertEqual(self.validator._correct_element_case("s,cu,fe"), "S,Cu,Fe")
+        self.assertEqual(self.validator._correct_element_case("fe,cu,s"), "Fe,Cu,S")
+
+    def test_is_corrected(self):
+        self.assertTrue(self.validator._is_corrected("Fe,Cu"))
+        for element_str in ("fe,Cu", "Fe, Cu", "Fe,Fe", "Fe,,Cu", "Fe,"):
+            with self.subTest(element_str=element_str):
+                self.assertFalse(self.validator._is_corrected(element_str))
+
+    def test_apply_corrections(self):
+        canonical = {"el_inc": "Fe,Cu", "el_exc": "S"}
+        self.assertIs(self.validator.apply_corrections(canonical), canonical)
+
+        params = {"el_inc": "cu, fe,Cu", "el_exc": "s", "ima": True}
+        self.assertEqual(
+            self.validator.apply_corrections(params),
+            {"el_inc": "Cu,Fe", "el_exc": "S", "ima": True}
+        )
+        # The input is left untouched
+        self.assertEqual(params["el_inc"], "cu, fe,Cu")
+
+    def test_element_symbols_are_case_insensitive(self):
+        self.assertEqual(self.validator.rule_chemical_element_validate({"el_inc": " fe,cU ", "el_exc": "s"}), (True, None))
+
+        is_valid, error = self.validator.rule_chemical_element_validate({"el_inc": "Fe,Xx"})
+        self.assertFalse(is_valid)
+        self.assertIn("xx", error)
+
+    def test_element_conflict_ignores_whitespace(self):
+        is_valid, error = self.validator.rule_element_conflict_validate({"el_inc": "Fe, Cu", "el_exc": " Cu"})
+        self.assertFalse(is_valid)
+        self.assertIn("Cu", error)
+
+
+class RunValidationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.validator = RuleValidator(VALID_FIELDS)
+
+    def test_collects_every_issue(self):
+        result = asyncio.run(self.validator.run_validation({"hardness_min": 11, "el_inc": "Fe", "el_exc": "Fe"}))
+        self.assertEqual(list(result["issues"]), ["rule_hardness_range", "rule_element_conflict"])
+
+    def test_fail_fast_reports_first_issue(self):
+        params = {"hardness_min": 11, "el_inc": "Fe", "el_exc": "Fe"}
+        for result in (
+            asyncio.run(self.validator.run_validation(params, fail_fast=True)),
+            self.validator.run_validation_sync(params, fail_fast=True),
+        ):
+            self.assertEqual(list(result["issues"]), ["rule_hardness_range"])
+
+    def test_valid_params_are_corrected(self):
+        result = self.validator.run_validation_sync({"ima": True, "el_inc": "cu,fe"})
+        self.assertEqual(result, {"status": "valid", "corrected_params": {"ima": True, "el_inc": "Cu,Fe"}})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import asyncio
+import sys
+import unittest
+from pathlib import Path
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.validation_pipeline import ValidationPipeline
+
+
+class ValidateWithoutCriteriaTest(unittest.TestCase):
+
+    def setUp(self):
+        # Without an LLM only the rule layer runs
+        self.pipeline = ValidationPipeline(llm=None)
+
+    def _validate(self, params):
+        return asyncio.run(self.pipeline.validate(params))
+
+    def test_failed_generation_reports_unknown_field(self):
+        result = self._validate({"error message": "Error after 3 attempts: timeout"})
+        self.assertEqual(result["status"], "invalid")
+        self.assertIn("error message", result["issues"]["rule_schema"])
+        self.assertIn("rule_completeness", result["issues"])
+
+    def test_only_unknown_fields(self):
+        result = self._validate({"color": "red", "ima": None})
+        self.assertEqual(set(result["issues"]), {"rule_schema", "rule_completeness"})
+        self.assertIn("color", result["issues"]["rule_schema"])
+
+    def test_empty_and_all_null_params_report_completeness_only(self):
+        for params in ({}, {"ima": None, "hardness_min": None, "el_inc": None}):
+            with self.subTest(params=params):
+                result = self._validate(params)
+                self.assertEqual(result["status"], "invalid")
+                self.assertEqual(list(result["issues"]), ["rule_completeness"])
+
+    def test_valid_params_are_corrected(self):
+        result = self._validate({"ima": True, "el_inc": "fe"})
+        self.assertEqual(result["status"], "valid")
+        self.assertEqual(result["corrected_params"], {"ima": True, "el_inc": "Fe"})
+
+
+if __name__ == "__main__":
+    unittest.main()
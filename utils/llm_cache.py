@@ -0,0 +1,155 @@
+import sqlite3
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple
+
+# ============================================================================
+# StructuredResponseCache - Caches validated structured LLM outputs
+# ============================================================================
+
+class StructuredResponseCache:
+    """
+    Two-level cache for structured LLM responses.
+    An in-process LRU dict sits in front of an on-disk SQLite table,
+    so repeated prompts skip the LLM round-trip entirely.
+    Entries expire after a time-to-live. Thread-safe, so async callers can
+    keep the SQLite I/O off the event loop with asyncio.to_thread.
+    """
+
+    def __init__(self, database_path: str = "./data/mindat_llm_cache.db", maxsize: int = 256,
+                 ttl: float = 7 * 24 * 3600):
+        """
+        Initialize response cache.
+
+        Args:
+            database_path: Local path of the SQLite cache file
+            maxsize: Maximum number of entries kept in the in-process LRU
+            ttl: Seconds an entry stays valid after it is stored
+        """
+        self.database_path = database_path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._memory: OrderedDict[str, Tuple[float, Dict[str, Any]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Create data directory if it doesn't exist
+        Path(self.database_path).parent.mkdir(parents=True, exist_ok=True)
+
+        self._conn = sqlite3.connect(self.database_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        """Hash the prompt parts into a compact cache key"""
+        digest = hashlib.blake2b(digest_size=16)
+        for part in parts:
+            digest.update(part.encode("utf-8"))
+            # Separator so ("ab", "c") and ("a", "bc") don't collide
+            digest.update(b"\x00")
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached response.
+
+        Returns:
+            A copy of the cached response, or None on a miss or if the entry has expired
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    return dict(value)
+                del self._memory[key]
+
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM responses WHERE key=?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._conn.execute("DELETE FROM responses WHERE key=?", (key,))
+                self._conn.commit()
+                return None
+
+            value = json.loads(row[0])
+            self._remember(key, row[1], value)
+            return dict(value)
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        """Store a response in both cache levels"""
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, expires_at, dict(value))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at)
+            )
+            self._conn.commit()
+
+    def _remember(self, key: str, expires_at: float, value: Dict[str, Any]) -> None:
+        """Insert into the in-process LRU and evict the oldest entry if full"""
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+
+# ============================================================================
+# TTLCache - In-process LRU cache with per-entry expiry
+# ============================================================================
+
+class TTLCache:
+    """
+    Bounded in-process LRU cache whose entries expire after a fixed time-to-live.
+    Suited for LLM results that may go stale, e.g. when prompts or schemas change.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600):
+        """
+        Initialize TTL cache.
+
+        Args:
+            maxsize: Maximum number of entries kept
+            ttl: Seconds an entry stays valid after it is stored
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[str, Tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Look up a cached value.
+
+        Returns:
+            The cached value, or None on a miss or if the entry has expired
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+
+        self._data.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        """Store a value and evict the least recently used entry if full"""
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
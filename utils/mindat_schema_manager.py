@@ -1,8 +1,26 @@
-import requests
+import asyncio
+import functools
+import httpx
+import orjson
 import yaml
+from email.utils import formatdate
 from pathlib import Path
 import os
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
+
+# Require the libyaml-backed loader, the pure-Python one is ~10x slower on the large OpenAPI schema
+try:
+    from yaml import CSafeLoader as _YAMLLoader
+except ImportError as e:
+    raise RuntimeError(
+        "PyYAML was built without libyaml; install libyaml and reinstall pyyaml with C extensions"
+    ) from e
+
+# Layout of the parameter docs embedded in LLM prompts
+_PROMPT_JSON_OPTION = orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS
+
+# Latest parsed schema shared by all manager instances, keyed by schema_path as (mtime, data)
+_SCHEMA_CACHE: Dict[str, Tuple[float, Dict[str, Any]]] = {}
 
 # ============================================================================
 # MindatAPISchemaManager - Manages API schema download and parsing
@@ -25,38 +43,198 @@ class MindatAPISchemaManager:
         """
         self.schema_url = schema_url
         self.schema_path = schema_path
+        # ETag of the downloaded schema, used for conditional re-downloads
+        self.etag_path = str(Path(schema_path).with_suffix('.etag'))
         self.schema_data = None
+        # Memoized schema_version(), reset whenever the schema is revalidated
+        self._schema_version: Optional[str] = None
+        # Whether the local schema was revalidated against the server in this process
+        self._schema_checked = False
+        self._refresh_lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+        
+        # Derived /v1/geomaterials/ docs persisted next to the schema for fast process starts
+        self.geomaterials_docs_path = str(Path(schema_path).with_name('geomaterials_endpoint.json'))
         
         # Cache for different endpoints
         self.endpoints_cache = {}
+        # Docs subsets already assembled, keyed by (endpoint, frozenset(param_names))
+        self.params_info_cache = {}
+        # Prompt-formatted JSON (bytes) of each parameter doc, filled on first use per endpoint
+        self.params_json_cache: Dict[str, Dict[str, bytes]] = {}
+        
+        # Skip the YAML parse entirely when the derived docs are newer than the schema
+        self._load_geomaterials_docs()
     
-    def download_schema(self) -> bool:
+    def _load_geomaterials_docs(self) -> bool:
         """
-        Download YAML schema file from Mindat API.
+        Load persisted /v1/geomaterials/ docs if they are newer than the schema file.
         
         Returns:
-            True if download successful, False otherwise
+            True if the endpoint cache was populated, False otherwise
         """
+        try:
+            if not (os.path.exists(self.geomaterials_docs_path) and os.path.exists(self.schema_path)):
+                return False
+            if os.path.getmtime(self.geomaterials_docs_path) <= os.path.getmtime(self.schema_path):
+                return False
+            
+            with open(self.geomaterials_docs_path, 'rb') as f:
+                endpoint_docs = orjson.loads(f.read())
+            self.endpoints_cache['/v1/geomaterials/'] = endpoint_docs
+            return True
+            
+        except Exception as e:
+            # A corrupt or unreadable file just means rebuilding from the schema
+            print(f"⚠️  Failed to load cached endpoint docs: {str(e)}")
+            return False
+    
+    def _save_geomaterials_docs(self, endpoint_docs: Dict[str, Any]) -> None:
+        """Persist derived /v1/geomaterials/ docs, written atomically."""
+        try:
+            tmp_path = self.geomaterials_docs_path + '.part'
+            with open(tmp_path, 'wb') as f:
+                f.write(orjson.dumps(endpoint_docs))
+            os.replace(tmp_path, self.geomaterials_docs_path)
+        except Exception as e:
+            print(f"⚠️  Failed to save endpoint docs: {str(e)}")
+    
+    async def download_schema_async(self) -> bool:
+        """
+        Download YAML schema file from Mindat API without blocking the event loop.
+        Sends the stored ETag and the local file time, so an unchanged schema
+        is answered with 304 Not Modified and no body transfer.
+        
+        Returns:
+            True if download successful or schema unchanged, False otherwise
+        """
+        tmp_path = self.schema_path + '.part'
         try:
             # Create data directory if it doesn't exist
             schema_dir = Path(self.schema_path).parent
             schema_dir.mkdir(parents=True, exist_ok=True)
             
-            # Download schema
-            response = requests.get(self.schema_url, timeout=30)
-            response.raise_for_status()
+            # Conditional headers only make sense when there is a local copy
+            headers = {}
+            if os.path.exists(self.schema_path):
+                headers["If-Modified-Since"] = formatdate(
+                    os.path.getmtime(self.schema_path), usegmt=True
+                )
+                if os.path.exists(self.etag_path):
+                    with open(self.etag_path, 'r', encoding='utf-8') as f:
+                        etag = f.read().strip()
+                    if etag:
+                        headers["If-None-Match"] = etag
+            
+            # Stream schema to a temporary file so a failed download never leaves a partial schema
+            async with httpx.AsyncClient(timeout=30, follow_redirects=True) as client:
+                async with client.stream("GET", self.schema_url, headers=headers) as response:
+                    if response.status_code == 304:
+                        # print(f"✅ Schema at {self.schema_path} is up to date")
+                        return True
+                    response.raise_for_status()
+                    
+                    with open(tmp_path, 'wb') as f:
+                        async for chunk in response.aiter_bytes(65536):
+                            f.write(chunk)
+                    etag = response.headers.get("ETag")
             
-            # Save to file
-            with open(self.schema_path, 'wb') as f:
-                f.write(response.content)
+            os.replace(tmp_path, self.schema_path)
+            if etag:
+                with open(self.etag_path, 'w', encoding='utf-8') as f:
+                    f.write(etag)
+            elif os.path.exists(self.etag_path):
+                # The old ETag belongs to the previous schema and must not be sent for this one
+                os.remove(self.etag_path)
             
             # print(f"✅ Schema downloaded successfully to {self.schema_path}")
             return True
             
         except Exception as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
             print(f"❌ Failed to download schema: {str(e)}")
             return False
     
+    async def refresh_schema_async(self) -> bool:
+        """
+        Revalidate the local schema against the server once per process.
+        An unchanged schema costs a 304, a new one drops the parsed schema
+        and derived docs so they are rebuilt from the downloaded file.
+        
+        Returns:
+            True if a local schema is available, False otherwise
+        """
+        if self._schema_checked:
+            return True
+        
+        async with self._refresh_lock:
+            # Concurrent first requests share a single revalidation
+            if self._schema_checked:
+                return True
+            
+            old_mtime = os.path.getmtime(self.schema_path) if os.path.exists(self.schema_path) else None
+            await self.download_schema_async()
+            self._schema_version = None
+            if not os.path.exists(self.schema_path):
+                return False
+            
+            if os.path.getmtime(self.schema_path) != old_mtime:
+                self.schema_data = None
+                self.endpoints_cache.clear()
+                self.params_info_cache.clear()
+                self.params_json_cache.clear()
+            
+            self._schema_checked = True
+            return True
+    
+    def schema_version(self) -> str:
+        """
+        Identify the local schema, for keying caches of results derived from it.
+        
+        Returns:
+            The schema's ETag, else its file time, or "" if there is no local schema
+        """
+        if self._schema_version is None:
+            version = ""
+            if os.path.exists(self.etag_path):
+                with open(self.etag_path, 'r', encoding='utf-8') as f:
+                    version = f.read().strip()
+            if not version and os.path.exists(self.schema_path):
+                version = str(os.path.getmtime(self.schema_path))
+            self._schema_version = version
+        return self._schema_version
+    
+    def start_schema_refresh(self) -> asyncio.Task:
+        """
+        Revalidate the local schema in a background task, started once per process.
+        Callers keep being served the local copy until the refresh finishes.
+        
+        Returns:
+            The refresh task, shared by all callers
+        """
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.get_running_loop().create_task(self.refresh_schema_async())
+        return self._refresh_task
+    
+    def download_schema(self) -> bool:
+        """
+        Download YAML schema file from Mindat API (synchronous wrapper).
+        Must not be called from a running event loop, await download_schema_async there.
+        
+        Returns:
+            True if download successful or schema unchanged, False otherwise
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.download_schema_async())
+        
+        # Waiting here would block the caller's loop for the whole download
+        raise RuntimeError(
+            "download_schema() can't be called from a running event loop, await download_schema_async() instead"
+        )
+    
     def load_schema(self) -> bool:
         """
         Load and parse YAML schema file.
@@ -70,8 +248,16 @@ class MindatAPISchemaManager:
                 if not self.download_schema():
                     return False
             
-            with open(self.schema_path, 'r', encoding='utf-8') as f:
-                self.schema_data = yaml.safe_load(f)
+            # Reuse the already parsed schema unless the file has changed since,
+            # a re-parse replaces the stale copy instead of keeping both alive
+            cache_key = os.path.abspath(self.schema_path)
+            mtime = os.path.getmtime(self.schema_path)
+            cached = _SCHEMA_CACHE.get(cache_key)
+            if cached is None or cached[0] != mtime:
+                with open(self.schema_path, 'r', encoding='utf-8') as f:
+                    cached = (mtime, yaml.load(f, Loader=_YAMLLoader))
+                _SCHEMA_CACHE[cache_key] = cached
+            self.schema_data = cached[1]
             
             # print(f"✅ Schema loaded successfully from {self.schema_path}")
             return True
@@ -116,28 +302,32 @@ class MindatAPISchemaManager:
             # Extract only name, description, and schema
             endpoint_docs = {}
             for param in parameters:
-                param_name = param.get('name')
+                param_get = param.get
+                param_name = param_get('name')
                 if not param_name:
                     continue
                 
-                # Get schema and remove 'type' to avoid confusion
-                schema = param.get('schema', {})
-                filtered_schema = {k: v for k, v in schema.items() if k != 'type'}
+                # Copy the schema and remove 'type' to avoid confusion,
+                # the parsed schema itself is shared and must stay untouched
+                schema = dict(param_get('schema') or {})
+                schema.pop('type', None)
                 
                 # Also remove 'type' from nested items if it's an array
-                if 'items' in filtered_schema and isinstance(filtered_schema['items'], dict):
-                    filtered_schema['items'] = {
-                        k: v for k, v in filtered_schema['items'].items() if k != 'type'
-                    }
+                items = schema.get('items')
+                if isinstance(items, dict):
+                    items = dict(items)
+                    items.pop('type', None)
+                    schema['items'] = items
                 
                 endpoint_docs[param_name] = {
                     'name': param_name,
-                    'description': param.get('description', ''),
-                    'schema': filtered_schema
+                    'description': param_get('description', ''),
+                    'schema': schema
                 }
             
-            # Cache the result
+            # Cache the result, and persist it so later processes skip the YAML parse
             self.endpoints_cache[endpoint_path] = endpoint_docs
+            self._save_geomaterials_docs(endpoint_docs)
             # print(f"✅ Extracted {len(endpoint_docs)} parameters from {endpoint_path}")
             return endpoint_docs
             
@@ -177,6 +367,11 @@ class MindatAPISchemaManager:
             Dictionary mapping parameter names to their documentation
             (only for parameters in param_names that exist in the endpoint)
         """
+        # Parameter sets repeat a lot across queries and the schema is static per process
+        cache_key = (endpoint, frozenset(param_names))
+        if cache_key in self.params_info_cache:
+            return dict(self.params_info_cache[cache_key])
+        
         if endpoint == '/v1/geomaterials/':
             endpoint_docs = self.get_geomaterials_endpoint()
         else:
@@ -184,11 +379,59 @@ class MindatAPISchemaManager:
             endpoint_docs = {}
         
         # Only return docs for requested parameters
-        return {
+        params_info = {
             name: endpoint_docs[name]
             for name in param_names
             if name in endpoint_docs
         }
+        
+        # Only memoize once the endpoint docs were actually extracted
+        if endpoint in self.endpoints_cache:
+            self.params_info_cache[cache_key] = params_info
+        return dict(params_info)
+    
+    def get_params_info_json(self, param_names: List[str], endpoint: str = '/v1/geomaterials/') -> bytes:
+        """
+        Get documentation for multiple parameters as indented, key-sorted JSON,
+        byte-identical to orjson.dumps(get_params_info(...), option=OPT_INDENT_2 | OPT_SORT_KEYS).
+        Each parameter doc is serialized once and reused, so building an LLM prompt
+        only joins bytes instead of re-serializing the nested docs.
+        
+        Args:
+            param_names: List of parameter names to extract
+            endpoint: API endpoint path (default: '/v1/geomaterials/')
+        
+        Returns:
+            UTF-8 encoded JSON object mapping parameter names to their documentation
+            (only for parameters in param_names that exist in the endpoint)
+        """
+        if endpoint == '/v1/geomaterials/':
+            endpoint_docs = self.get_geomaterials_endpoint()
+        else:
+            # Future: support other endpoints
+            endpoint_docs = {}
+        
+        docs_json = self.params_json_cache.setdefault(endpoint, {}) if endpoint in self.endpoints_cache else {}
+        entries = []
+        for name in sorted(set(param_names) & endpoint_docs.keys()):
+            entry = docs_json.get(name)
+            if entry is None:
+                # Nest the doc one level deeper, JSON strings never contain raw newlines
+                doc = orjson.dumps(endpoint_docs[name], option=_PROMPT_JSON_OPTION).replace(b"\n", b"\n  ")
+                entry = docs_json[name] = b"  " + orjson.dumps(name) + b": " + doc
+            entries.append(entry)
+        
+        if not entries:
+            return b"{}"
+        return b"{\n" + b",\n".join(entries) + b"\n}"
+
+@functools.lru_cache(maxsize=1)
+def get_schema_manager() -> MindatAPISchemaManager:
+    """
+    Process-wide schema manager with default settings.
+    Schema loading and endpoint extraction happen once and are shared by all callers.
+    """
+    return MindatAPISchemaManager()
 
 if __name__ == "__main__":
     pass
@@ -1,29 +1,64 @@
 import os
+import copy
 import json
 import asyncio
-from typing import Tuple, Optional, Dict, Any, List, Literal
-from pydantic import BaseModel, Field
+import hashlib
+import orjson
+from typing import Tuple, Optional, Dict, Any, List
 
 import sys
 from pathlib import Path
 # Add project root to Python path
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
-from utils.mindat_schema_manager import MindatAPISchemaManager
+from utils.mindat_schema_manager import get_schema_manager
+from utils.llm_cache import TTLCache
+
+# Validation results shared across ModelValidator instances (one is built per pipeline)
+_validation_cache = TTLCache(maxsize=1024, ttl=3600)
+
+# Statuses the intent/hallucination prompt asks the model to answer with
+_VALIDATION_STATUSES = ("valid", "invalid")
 
-class IntentHallucinationValidationOutput(BaseModel):
-    """Structured output for Intent and Hallucination validation"""
-    status: Literal["valid", "invalid"] = Field(
-        description="Validation status: 'valid' if passes, 'invalid' if fails or needs user confirmation"
-    )
-    issues: Optional[Dict[str, str]] = Field(
-        default=None,
-        description="Parameters with issues, mapping param name to reason. For 'invalid' status, use '_error' as key for general errors."
-    )
-    
 class ModelValidator:
     """LLM-based validators (slow, asynchronous)"""
     
+    # Fixed instruction block, only the query/params/docs slots change per request
+    _PROMPT_TEMPLATE = """Validate API parameters against user query and documentation.
+
+USER QUERY: "{q}"
+PARAMETERS: {p}
+API DOCS: {d}
+
+Check:
+1. Are all GENERATED parameters relevant to the query?
+2. For parameters that EXIST in the API docs provided, are there missing values the user mentioned?
+3. Do values comply with API constraints (enum values, format)?
+4. Are values based on user input or fabricated?
+
+CRITICAL RULES:
+- ONLY validate parameters that appear in the provided API DOCS
+- Do NOT suggest parameters that are not in the API DOCS, even if they seem relevant
+- "Missing parameter" means: user mentioned a requirement that maps to a provided API parameter, but it's not set
+- Example: User says "no sulfur", API docs include "el_exc", but el_exc is not in parameters → INVALID (missing el_exc)
+- Counter-example: User says "red minerals", but API docs don't include a color parameter → VALID (API doesn't support color filter, not our fault)
+- Reject non mineral dataset querying inputs, even if it might mention mineral-related information e.g., I am drinking iron mineral water → INVALID
+- Reject mineral queries that are too vague to map to any API parameters e.g., Find me some green minerals → INVALID
+
+IMPORTANT: Do NOT check data types (string vs array, etc). Data type validation is handled by other mechanisms. Focus only on semantic correctness.
+
+Response format (JSON object):
+{{
+    "status": "valid" | "invalid",
+    "issues": {{"param_name": "reason"}}  // Only if status is not "valid"
+}}
+
+Examples:
+1. Invalid: User "with iron, no sulfur", Params {{"el_inc": "Fe"}} → {{"status": "invalid", "issues": {{"el_exc": "User said 'no sulfur' but el_exc is missing"}}}}
+2. Invalid: User "like quartz", Params {{"hardness_min": 7}} → {{"status": "Invalid", "issues": {{"hardness_min": "Inferred from quartz, not explicit"}}}}
+3. Valid: User "hardness 5-7", Params {{"hardness_min": 5, "hardness_max": 7}} → {{"status": "valid"}}
+"""
+    
     def __init__(self, llm):
         """
         Initialize model validator.
@@ -32,25 +67,29 @@ class ModelValidator:
             llm: Language model for validation
         """
         self.llm = llm
-        self.schema_manager = MindatAPISchemaManager()
-        
-        # Ensure schema is loaded
-        self._ensure_schema_loaded()
+        # Bind JSON mode once rather than on every validation request
+        self._json_llm = llm.bind(response_format={"type": "json_object"}) if llm else None
+        # Shared per process, so a new pipeline doesn't re-parse the schema
+        self.schema_manager = get_schema_manager()
     
-    def _ensure_schema_loaded(self):
-        """Ensure API schema is downloaded and loaded"""
-        if not os.path.exists(self.schema_manager.schema_path):
-            # print("Downloading Mindat API schema...")
-            self.schema_manager.download_schema()
-        self.schema_manager.load_schema()
-        # Pre-load geomaterials endpoint
-        self.schema_manager.get_geomaterials_endpoint()
+    async def _ensure_schema_loaded(self, endpoint: str = '/v1/geomaterials/'):
+        """Ensure API schema is downloaded, revalidated and loaded without blocking the event loop"""
+        if os.path.exists(self.schema_manager.schema_path):
+            # Revalidate in the background, this request is served from the local copy
+            self.schema_manager.start_schema_refresh()
+        else:
+            # Nothing local to serve yet, wait for the download
+            await self.schema_manager.refresh_schema_async()
+        if endpoint == '/v1/geomaterials/' and endpoint not in self.schema_manager.endpoints_cache:
+            # Pre-load geomaterials endpoint off the loop, this only parses the schema if no cached docs exist
+            await asyncio.to_thread(self.schema_manager.get_geomaterials_endpoint)
     
     async def model_intent_hallucination_validate(
         self,
         params: dict,
         original_query: str,
-        api_docs: dict
+        api_docs: dict,
+        api_docs_json: Optional[str] = None
     ) -> Tuple[str, Optional[Dict[str, Dict[str, Any]]]]:
         """
         Validate Intent and Hallucination using API documentation and LLM.
@@ -68,6 +107,8 @@ class ModelValidator:
             params: Generated parameters to validate
             original_query: Original user query
             api_docs: API documentation for relevant parameters
+            api_docs_json: api_docs already rendered as indented, key-sorted JSON,
+                e.g. from MindatAPISchemaManager.get_params_info_json (dumped here if None)
         
         Returns:
             (status, issues)
@@ -81,70 +122,60 @@ class ModelValidator:
                     }
                 }
         """
-        prompt = f"""Validate API parameters against user query and documentation.
-
-USER QUERY: "{original_query}"
-PARAMETERS: {json.dumps(params, indent=2)}
-API DOCS: {json.dumps(api_docs, indent=2)}
-
-Check:
-1. Are all GENERATED parameters relevant to the query?
-2. For parameters that EXIST in the API docs provided, are there missing values the user mentioned?
-3. Do values comply with API constraints (enum values, format)?
-4. Are values based on user input or fabricated?
-
-CRITICAL RULES:
-- ONLY validate parameters that appear in the provided API DOCS
-- Do NOT suggest parameters that are not in the API DOCS, even if they seem relevant
-- "Missing parameter" means: user mentioned a requirement that maps to a provided API parameter, but it's not set
-- Example: User says "no sulfur", API docs include "el_exc", but el_exc is not in parameters → INVALID (missing el_exc)
-- Counter-example: User says "red minerals", but API docs don't include a color parameter → VALID (API doesn't support color filter, not our fault)
-- Reject non mineral dataset querying inputs, even if it might mention mineral-related information e.g., I am drinking iron mineral water → INVALID
-- Reject mineral queries that are too vague to map to any API parameters e.g., Find me some green minerals → INVALID
-
-IMPORTANT: Do NOT check data types (string vs array, etc). Data type validation is handled by other mechanisms. Focus only on semantic correctness.
-
-Response format:
-{{
-    "status": "valid" | "invalid",
-    "issues": {{"param_name": "reason"}}  // Only if status is not "valid"
-}}
-
-Examples:
-1. Invalid: User "with iron, no sulfur", Params {{"el_inc": "Fe"}} → {{"status": "invalid", "issues": {{"el_exc": "User said 'no sulfur' but el_exc is missing"}}}}
-2. Invalid: User "like quartz", Params {{"hardness_min": 7}} → {{"status": "Invalid", "issues": {{"hardness_min": "Inferred from quartz, not explicit"}}}}
-3. Valid: User "hardness 5-7", Params {{"hardness_min": 5, "hardness_max": 7}} → {{"status": "valid"}}
-"""
+        # Identical (params, query, docs) triples get the same verdict, skip the LLM call
+        cache_key = hashlib.blake2b(
+            json.dumps(
+                {"p": params, "q": original_query.strip().lower(), "d": api_docs},
+                sort_keys=True
+            ).encode(),
+            digest_size=16
+        ).hexdigest()
+        cached = _validation_cache.get(cache_key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+        
+        dump_option = orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS
+        prompt = self._PROMPT_TEMPLATE.format(
+            q=original_query,
+            p=orjson.dumps(params, option=dump_option).decode(),
+            d=api_docs_json if api_docs_json is not None else orjson.dumps(api_docs, option=dump_option).decode()
+        )
         
         try:
-            # Use structured output with Pydantic model
-            response = await self.llm.with_structured_output(IntentHallucinationValidationOutput).ainvoke(prompt)
+            # One JSON-mode call, parsed with orjson
+            text = self._strip_code_fence((await self._json_llm.ainvoke(prompt)).content)
+            parsed = self._parse_raw_output(text)
+            if parsed is None:
+                # Not a verdict we can read, report it instead of guessing (and don't cache it)
+                return "invalid", {
+                    "_error": {
+                        "value": None,
+                        "reason": f"Unparseable validation reply: {text[:200]!r}",
+                        "api_doc": {}
+                    }
+                }
+            status, llm_issues = parsed
             
             # Build structured issues if any
-            if response.status == 'valid':
+            if status == 'valid':
+                _validation_cache.put(cache_key, ("valid", None))
                 return "valid", None
             
             # Has issues - add value and api_doc to each
-            llm_issues = response.issues or {}
-            structured_issues = {}
-            
-            for param_name, reason in llm_issues.items():
-                if param_name == "_error":
-                    # General error
-                    structured_issues["_error"] = {
-                        "value": None,
-                        "reason": reason,
-                        "api_doc": {}
-                    }
-                else:
-                    # Parameter-specific issue
-                    structured_issues[param_name] = {
-                        "value": params.get(param_name),
-                        "reason": reason,
-                        "api_doc": api_docs.get(param_name, {})
-                    }
+            params_get = params.get
+            docs_get = api_docs.get
+            structured_issues = {
+                # General error carries no value or doc, parameter-specific issues do
+                param_name: (
+                    {"value": None, "reason": reason, "api_doc": {}}
+                    if param_name == "_error" else
+                    {"value": params_get(param_name), "reason": reason, "api_doc": docs_get(param_name, {})}
+                )
+                for param_name, reason in llm_issues.items()
+            }
             
-            return response.status, structured_issues
+            _validation_cache.put(cache_key, (status, copy.deepcopy(structured_issues)))
+            return status, structured_issues
         
         except Exception as e:
             # Return as invalid with error
@@ -156,6 +187,59 @@ Examples:
                 }
             }
     
+    @staticmethod
+    def _strip_code_fence(content: Any) -> str:
+        """Raw LLM reply text, without the markdown code fence models often wrap JSON in"""
+        text = content.strip() if isinstance(content, str) else ""
+        if text.startswith("```"):
+            text = text.strip("`").removeprefix("json").strip()
+        return text
+    
+    @staticmethod
+    def _parse_raw_output(text: str) -> Optional[Tuple[str, Dict[str, str]]]:
+        """
+        Parse a raw LLM reply into (status, issues).
+        Status is matched case-insensitively and issue reasons are stringified.
+        
+        Returns:
+            (status, issues), or None if the reply isn't a clear verdict
+        """
+        try:
+            data = orjson.loads(text)
+        except orjson.JSONDecodeError:
+            return None
+        if not isinstance(data, dict):
+            return None
+        
+        status = data.get("status")
+        issues = data.get("issues") or {}
+        if not isinstance(status, str) or not isinstance(issues, dict):
+            return None
+        status = status.lower()
+        if status not in _VALIDATION_STATUSES:
+            return None
+        return status, {str(name): str(reason) for name, reason in issues.items()}
+    
+    async def model_intent_hallucination_validate_batch(
+        self,
+        items: List[Tuple[dict, str, dict]]
+    ) -> List[Tuple[str, Optional[Dict[str, Dict[str, Any]]]]]:
+        """
+        Validate many (params, original_query, api_docs) items concurrently.
+        
+        Args:
+            items: List of (params, original_query, api_docs) tuples
+        
+        Returns:
+            List of (status, issues) results, in the same order as items
+        """
+        # Create all tasks first, then await them together so the LLM calls overlap
+        tasks = [
+            asyncio.create_task(self.model_intent_hallucination_validate(*item))
+            for item in items
+        ]
+        return await asyncio.gather(*tasks)
+    
     async def run_validation(
         self,
         params: dict,
@@ -182,17 +266,24 @@ Examples:
                 }
             }
         """
-        # Get API documentation
+        # Get API documentation, as dicts for the issues and pre-serialized for the prompt
+        await self._ensure_schema_loaded(endpoint)
+        param_names = list(params.keys())
         api_docs = self.schema_manager.get_params_info(
-            param_names=list(params.keys()),
+            param_names=param_names,
             endpoint=endpoint
         )
+        api_docs_json = self.schema_manager.get_params_info_json(
+            param_names=param_names,
+            endpoint=endpoint
+        ).decode()
         
         # Run validation and get structured result
         status, issues = await self.model_intent_hallucination_validate(
             params,
             original_query,
-            api_docs
+            api_docs,
+            api_docs_json
         )
         
         # Build result
@@ -1,13 +1,48 @@
-from typing import Tuple, Optional, Dict, Any, List, Callable
+from typing import Tuple, Optional, Dict, Any
 # import json
-# import asyncio
+import functools
 # from pydantic import BaseModel, Field
 from typing import Optional
 
 
+# Immutable lookup sets, built once per process and shared by all RuleValidator instances
+VALID_CRYSTAL_SYSTEMS = frozenset({
+    'Amorphous', 'Hexagonal', 'Icosahedral', 'Isometric',
+    'Monoclinic', 'Orthorhombic', 'Tetragonal', 'Triclinic', 'Trigonal'
+})
+
+VALID_ELEMENTS = frozenset({
+    "H", "Li", "Be", "B", "C", "N", "O", "F", "Na", "Mg", "Al", "Si", "P", "S", "Cl", "K", "Ca", "Sc", "Ti", "V", "Cr", "Mn", "Fe", "Co", "Ni", "Cu", "Zn", "Ga", "Ge", "As", "Se", "Br", "Rb", "Sr", "Y", "Zr", "Nb", "Mo", "Ru", "Rh", "Pd", "Ag", "Cd", "In", "Sn", "Sb", "Te", "I", "Cs", "Ba", "La", "Ce", "Pr", "Nd", "Sm", "Eu", "Gd", "Tb", "Dy", "Ho", "Er", "Tm", "Yb", "Lu", "Hf", "Ta", "W", "Re", "Os", "Ir", "Pt", "Au", "Hg", "Tl", "Pb", "Bi", "Ra", "Th", "U", "[]", "OH", "H2O", "H3O", "BO3", "NH4", "NH2", "NO3", "CO3", "PO4", "SO4", "SO3", "AsO4", "AsO3", "VO4", "CrO4", "SeO4", "SeO3", "MoO4", "SnOH", "SbO4", "SbO3", "TeO4", "TeO3", "IO3", "WO4", "UO2", "SiO4", "SiO3", "Si3O9", "CH3COO", "HCOO", "C2O4"
+})
+
+
+@functools.lru_cache(maxsize=512)
+def _parse_elements_cached(element_str: str) -> frozenset:
+    """Parse comma-separated element string, memoized since the same element lists recur"""
+    return frozenset(e for e in (s.strip() for s in element_str.split(',')) if e)
+
+
 class RuleValidator:
     """Rule-based validators (non-LLM, fast, synchronous)"""
     
+    # All validation rules as (rule_name, method_name), run in this order
+    _RULES: Tuple[Tuple[str, str], ...] = (
+        ('rule_schema', 'rule_schema_validate'),
+        ('rule_hardness_range', 'rule_hardness_range_validate'),
+        ('rule_crystal_system', 'rule_crystal_system_validate'),
+        ('rule_chemical_element', 'rule_chemical_element_validate'),
+        ('rule_element_conflict', 'rule_element_conflict_validate'),
+        # ('rule_expand_option', 'rule_expand_option_validate'),
+        ('rule_completeness', 'rule_completeness_validate'),
+    )
+    
+    # Fields that count as search criteria for rule_completeness
+    _SEARCH_FIELDS: Tuple[str, ...] = (
+        'ima', 'hardness_min', 'hardness_max', 'crystal_system', 'el_inc', 'el_exc'
+    )
+    _SEARCH_FIELDS_SET = frozenset(_SEARCH_FIELDS)
+    _COMPLETENESS_ERROR = "At least one search criterion must be specified"
+    
     def __init__(self, valid_fields: set = None):
         """
         Initialize rule validator.
@@ -18,63 +53,55 @@ class RuleValidator:
         self.valid_fields = valid_fields
         
         # Constants for validation
-        self.mohs_scale_min = 1
-        self.mohs_scale_max = 10
-        self.valid_crystal_systems = {
-            'Amorphous', 'Hexagonal', 'Icosahedral', 'Isometric',
-            'Monoclinic', 'Orthorhombic', 'Tetragonal', 'Triclinic', 'Trigonal'
-        }
+        self.valid_crystal_systems = VALID_CRYSTAL_SYSTEMS
         # self.valid_expand_options = {
         #     'description', 'type_localities', 'locality', 'relations', 'minstats'
         # }
         self.valid_elements = self._load_periodic_table()
-        self.search_fields = [
-            'ima', 'hardness_min', 'hardness_max', 'crystal_system', 'el_inc', 'el_exc'
-        ]
-        
-        # Register all validation methods
-        self.validators: Dict[str, Callable] = {
-            'rule_schema': self.rule_schema_validate,
-            'rule_hardness_range': self.rule_hardness_range_validate,
-            'rule_crystal_system': self.rule_crystal_system_validate,
-            'rule_chemical_element': self.rule_chemical_element_validate,
-            'rule_element_conflict': self.rule_element_conflict_validate,
-            # 'rule_expand_option': self.rule_expand_option_validate,
-            'rule_completeness': self.rule_completeness_validate,
-        }
+        # Case-insensitive lookups, built once instead of on every validation
+        self._element_lookup = {e.lower(): e for e in self.valid_elements}
+        self._valid_elements_lower = frozenset(self._element_lookup)
+        self.search_fields = list(self._SEARCH_FIELDS)
     
-    def _load_periodic_table(self) -> set:
+    def _load_periodic_table(self) -> frozenset:
         """Load all valid element symbols"""
-        return {
-            "H", "Li", "Be", "B", "C", "N", "O", "F", "Na", "Mg", "Al", "Si", "P", "S", "Cl", "K", "Ca", "Sc", "Ti", "V", "Cr", "Mn", "Fe", "Co", "Ni", "Cu", "Zn", "Ga", "Ge", "As", "Se", "Br", "Rb", "Sr", "Y", "Zr", "Nb", "Mo", "Ru", "Rh", "Pd", "Ag", "Cd", "In", "Sn", "Sb", "Te", "I", "Cs", "Ba", "La", "Ce", "Pr", "Nd", "Sm", "Eu", "Gd", "Tb", "Dy", "Ho", "Er", "Tm", "Yb", "Lu", "Hf", "Ta", "W", "Re", "Os", "Ir", "Pt", "Au", "Hg", "Tl", "Pb", "Bi", "Ra", "Th", "U", "[]", "OH", "H2O", "H3O", "BO3", "NH4", "NH2", "NO3", "CO3", "PO4", "SO4", "SO3", "AsO4", "AsO3", "VO4", "CrO4", "SeO4", "SeO3", "MoO4", "SnOH", "SbO4", "SbO3", "TeO4", "TeO3", "IO3", "WO4", "UO2", "SiO4", "SiO3", "Si3O9", "CH3COO", "HCOO", "C2O4"
-        }
+        return VALID_ELEMENTS
     
-    def _parse_elements(self, element_str: str) -> set:
+    def _parse_elements(self, element_str: str) -> frozenset:
         """Parse comma-separated element string into set"""
-        return {e.strip() for e in element_str.split(',') if e.strip()}
+        return _parse_elements_cached(element_str)
     
     def _correct_element_case(self, element_str: str) -> str:
         """
         Correct element case to match valid_elements.
         Should only be called after validation passes.
+        Keeps the user's order and drops duplicates.
         
         E.g., "fe,cu" -> "Fe,Cu"
         """
-        # Create case-insensitive lookup dictionary
-        element_lookup = {elem.lower(): elem for elem in self.valid_elements}
-        
-        elements = self._parse_elements(element_str)
-        corrected = set()
-        
-        for elem in elements:
-            elem_lower = elem.lower()
-            if elem_lower in element_lookup:
-                corrected.add(element_lookup[elem_lower])
-            else:
-                # This shouldn't happen if validation passed, but keep original as fallback
-                corrected.add(elem)
-        
-        return ','.join(sorted(corrected))
+        element_lookup = self._element_lookup
+        
+        seen = set()
+        corrected = []
+        
+        for raw in element_str.split(','):
+            elem = raw.strip()
+            if not elem:
+                continue
+            # Unknown symbols shouldn't happen if validation passed, but keep original as fallback
+            canonical = element_lookup.get(elem.lower(), elem)
+            if canonical not in seen:
+                seen.add(canonical)
+                corrected.append(canonical)
+        
+        return ','.join(corrected)
+
+    def _is_corrected(self, element_str: str) -> bool:
+        """Whether _correct_element_case would return element_str unchanged"""
+        # Valid symbols never contain whitespace, so this also rules out padding and empty entries
+        tokens = element_str.split(',')
+        unique = set(tokens)
+        return len(unique) == len(tokens) and unique <= self.valid_elements
 
     def rule_schema_validate(self, params: dict) -> Tuple[bool, Optional[str]]:
         """
@@ -84,7 +111,7 @@ class RuleValidator:
         Example failure: {"ima": True, "unknown_field": 123} -> Error: unexpected field 'unknown_field'
         Example success: {"ima": True, "hardness_min": 3} -> All fields are valid
         
-        This is a safety net beyond Pydantic's type checking.
+        This is a safety net beyond the per-field type checks applied to each generation.
         """
         if not self.valid_fields:
             return True, None
@@ -101,19 +128,16 @@ class RuleValidator:
         hardness_max = params.get('hardness_max')
         
         # Validate min
-        if hardness_min is not None:
-            if not (self.mohs_scale_min <= hardness_min <= self.mohs_scale_max):
-                return False, f"hardness_min must be between {self.mohs_scale_min} and {self.mohs_scale_max}"
+        if hardness_min is not None and not 1 <= hardness_min <= 10:
+            return False, "hardness_min must be between 1 and 10"
         
         # Validate max
-        if hardness_max is not None:
-            if not (self.mohs_scale_min <= hardness_max <= self.mohs_scale_max):
-                return False, f"hardness_max must be between {self.mohs_scale_min} and {self.mohs_scale_max}"
+        if hardness_max is not None and not 1 <= hardness_max <= 10:
+            return False, "hardness_max must be between 1 and 10"
         
         # Validate min <= max
-        if hardness_min is not None and hardness_max is not None:
-            if hardness_min > hardness_max:
-                return False, "hardness_min cannot exceed hardness_max"
+        if hardness_min is not None and hardness_max is not None and hardness_min > hardness_max:
+            return False, "hardness_min cannot exceed hardness_max"
         
         return True, None
     
@@ -126,7 +150,7 @@ class RuleValidator:
         
         invalid = set(crystal_system) - self.valid_crystal_systems
         if invalid:
-            return False, f"Invalid crystal systems: {invalid}. Valid options: {self.valid_crystal_systems}"
+            return False, f"Invalid crystal systems: {invalid}. Valid options: {set(self.valid_crystal_systems)}"
         
         return True, None
     
@@ -135,24 +159,27 @@ class RuleValidator:
         el_inc = params.get('el_inc')
         el_exc = params.get('el_exc')
         
-        # Create case-insensitive lookup
-        valid_elements_lower = {elem.lower() for elem in self.valid_elements}
+        valid_elements_lower = self._valid_elements_lower
         
         # Validate included elements
         if el_inc:
             elements = self._parse_elements(el_inc)
-            elements_lower = {elem.lower() for elem in elements}
-            invalid = elements_lower - valid_elements_lower
-            if invalid:
-                return False, f"Invalid elements in el_inc: {invalid}"
+            # Already-canonical symbols (the usual LLM output) skip the lowercase pass
+            if not elements <= self.valid_elements:
+                elements_lower = {elem.lower() for elem in elements}
+                invalid = elements_lower - valid_elements_lower
+                if invalid:
+                    return False, f"Invalid elements in el_inc: {invalid}"
         
         # Validate excluded elements
         if el_exc:
             elements = self._parse_elements(el_exc)
-            elements_lower = {elem.lower() for elem in elements}
-            invalid = elements_lower - valid_elements_lower
-            if invalid:
-                return False, f"Invalid elements in el_exc: {invalid}"
+            # Already-canonical symbols (the usual LLM output) skip the lowercase pass
+            if not elements <= self.valid_elements:
+                elements_lower = {elem.lower() for elem in elements}
+                invalid = elements_lower - valid_elements_lower
+                if invalid:
+                    return False, f"Invalid elements in el_exc: {invalid}"
         
         return True, None
     
@@ -169,7 +196,7 @@ class RuleValidator:
         
         conflicts = inc_elements & exc_elements
         if conflicts:
-            return False, f"Elements cannot be both included and excluded: {conflicts}"
+            return False, f"Elements cannot be both included and excluded: {set(conflicts)}"
         
         return True, None
     
@@ -200,13 +227,12 @@ class RuleValidator:
         
         Note: All fields in search_fields (including 'ima') are considered valid search criteria.
         """
-        has_criteria = any(
-            params.get(field) is not None 
-            for field in self.search_fields
-        )
+        # Key-view intersection runs in C, only the present search fields are checked for None
+        present = self._SEARCH_FIELDS_SET & params.keys()
+        has_criteria = any(params[field] is not None for field in present)
         
         if not has_criteria:
-            return False, "At least one search criterion must be specified"
+            return False, self._COMPLETENESS_ERROR
         
         return True, None
     
@@ -218,23 +244,32 @@ class RuleValidator:
             params: Parameters to correct
         
         Returns:
-            Corrected parameters
+            Corrected parameters (the original dict if nothing needs correcting)
         """
+        fields = [
+            field for field in ('el_inc', 'el_exc')
+            if params.get(field) and not self._is_corrected(params[field])
+        ]
+        if not fields:
+            return params
+        
         corrected = params.copy()
         
         # Normalize and correct case for element strings
-        for field in ['el_inc', 'el_exc']:
-            if corrected.get(field):
-                corrected[field] = self._correct_element_case(corrected[field])
+        for field in fields:
+            corrected[field] = self._correct_element_case(corrected[field])
         
         return corrected
     
-    def run_validation(self, params: dict) -> Dict[str, Any]:
+    async def run_validation(self, params: dict, fail_fast: bool = False) -> Dict[str, Any]:
         """
         Run all rule validators and return structured results.
+        The rules take microseconds each, so they run in order in-process,
+        a thread hop per rule would cost more than the rules themselves.
         
         Args:
             params: Parameters to validate
+            fail_fast: Stop at the first failing rule and report only that issue
         
         Returns:
             {
@@ -246,10 +281,37 @@ class RuleValidator:
                 "corrected_params": dict  # Only if status is "valid"
             }
         """
+        return self.run_validation_sync(params, fail_fast)
+    
+    def run_validation_sync(self, params: dict, fail_fast: bool = False) -> Dict[str, Any]:
+        """
+        Run all rule validators from synchronous code.
+        Same arguments and return structure as run_validation.
+        """
+        if fail_fast:
+            return self._run_fail_fast(params)
+        results = [
+            (name, getattr(self, method_name)(params))
+            for name, method_name in self._RULES
+        ]
+        return self._build_result(params, results)
+    
+    def _run_fail_fast(self, params: dict) -> Dict[str, Any]:
+        """Run the rules in order and return as soon as one fails."""
+        for name, method_name in self._RULES:
+            is_valid, error = getattr(self, method_name)(params)
+            if not is_valid:
+                return {
+                    "status": "invalid",
+                    "issues": {name: error}
+                }
+        return self._build_result(params, ())
+    
+    def _build_result(self, params: dict, results) -> Dict[str, Any]:
+        """Build the structured result from (rule_name, (is_valid, error)) pairs."""
         issues = {}
         
-        for name in self.validators:
-            is_valid, error = self.validators[name](params)
+        for name, (is_valid, error) in results:
             if not is_valid:
                 # Use validator name as key
                 issues[name] = error
@@ -281,5 +343,5 @@ if __name__ == "__main__":
     #     # "el_inc": "Fe,Cu,Xx",  # Invalid
     #     "el_exc": "S,Fe"  # Conflict with el_inc
     # }
-    # result = validator.run_validation(test_params)
+    # result = validator.run_validation_sync(test_params)
     # print(result)
\ No newline at end of file
@@ -0,0 +1,34 @@
+import atexit
+import functools
+from phoenix.otel import register
+
+# ============================================================================
+# Phoenix tracing - one tracer provider per process
+# ============================================================================
+
+@functools.lru_cache(maxsize=1)
+def get_tracer_provider():
+    """
+    Register the Phoenix tracer provider once per process.
+    Repeated calls return the same provider, and pending spans are
+    flushed at interpreter exit instead of at the end of each entry point.
+
+    Returns:
+        The registered tracer provider
+    """
+    tracer_provider = register(
+        project_name="mindat_ai_setup",
+        auto_instrument=True,
+        batch=True,
+        protocol="http/protobuf", # mute the warning about default protocol
+    )
+    atexit.register(_shutdown_tracer_provider, tracer_provider)
+    return tracer_provider
+
+
+def _shutdown_tracer_provider(tracer_provider) -> None:
+    """Ensure all phoenix traces are sent before shutdown"""
+    if hasattr(tracer_provider, 'force_flush'):
+        tracer_provider.force_flush(timeout_millis=30000)
+    if hasattr(tracer_provider, 'shutdown'):
+        tracer_provider.shutdown()
@@ -1,8 +1,7 @@
 from typing import Dict, Any
 import json
 import asyncio
-from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Annotated, Optional, TypedDict
 
 import sys
 from pathlib import Path
@@ -13,14 +12,20 @@ from utils.rule_validator import RuleValidator
 from utils.model_validator import ModelValidator
 
 
-class MindatQueryDict(BaseModel):
-    ima: Optional[bool] = Field(description="Only IMA-approved names, should be True by default except for user-specified otherwise")
-    hardness_min: Optional[float] = Field(description="Minimum Mohs hardness (inclusive, >=). For 'not less than 5', use 5, NOT 5.01.")
-    hardness_max: Optional[float] = Field(description="Maximum Mohs hardness (inclusive, <=). For 'not more than 5', use 5.")
-    crystal_system: Optional[list[str]] = Field(description="Crystal system: multiple choice (OR), Items Enum: 'Amorphous','Hexagonal','Icosahedral','Isometric','Monoclinic','Orthorhombic','Tetragonal','Triclinic','Trigonal'")
-    el_inc: Optional[str] = Field(description="Chemical elements must include, e.g., 'Fe,Cu'")
-    el_exc: Optional[str] = Field(description="Chemical elements must exclude, e.g., 'Fe,Cu'")
-    # expand: Optional[str] = Field(description="Expand the search scope, 'description','type_localities','locality','relations','minstats', leave blank if necessary")
+class MindatQueryDict(TypedDict):
+    # Annotated[type, default, description]: `...` keeps every field required (nullable) in the LLM schema,
+    # so generations always carry the same keys and compare cleanly for consensus
+    ima: Annotated[Optional[bool], ..., "Only IMA-approved names, should be True by default except for user-specified otherwise"]
+    hardness_min: Annotated[Optional[float], ..., "Minimum Mohs hardness (inclusive, >=). For 'not less than 5', use 5, NOT 5.01."]
+    hardness_max: Annotated[Optional[float], ..., "Maximum Mohs hardness (inclusive, <=). For 'not more than 5', use 5."]
+    crystal_system: Annotated[Optional[list[str]], ..., "Crystal system: multiple choice (OR), Items Enum: 'Amorphous','Hexagonal','Icosahedral','Isometric','Monoclinic','Orthorhombic','Tetragonal','Triclinic','Trigonal'"]
+    el_inc: Annotated[Optional[str], ..., "Chemical elements must include, e.g., 'Fe,Cu'"]
+    el_exc: Annotated[Optional[str], ..., "Chemical elements must exclude, e.g., 'Fe,Cu'"]
+    # expand: Annotated[Optional[str], ..., "Expand the search scope, 'description','type_localities','locality','relations','minstats', leave blank if necessary"]
+
+
+# Field names of MindatQueryDict, used for schema validation
+VALID_FIELDS = frozenset(MindatQueryDict.__annotations__)
 
 
 # ============================================================================
@@ -37,8 +42,8 @@ class ValidationPipeline:
         Args:
             llm: Language model for LLM-based validation
         """
-        # Automatically extract valid fields from MindatQueryDict
-        valid_fields = set(MindatQueryDict.model_fields.keys())
+        # Valid fields extracted once from MindatQueryDict
+        valid_fields = VALID_FIELDS
         
         # Initialize validators
         self.rule_validator = RuleValidator(valid_fields)
@@ -67,8 +72,24 @@ class ValidationPipeline:
                 "corrected_params": dict  # Corrected parameters (only present when rule validation passes)
             }
         """
-        # Layer 1: Rule validators (fast, synchronous)
-        rule_result = self.rule_validator.run_validation(params)
+        # Nothing to search on: skip the full rule sweep, rule_completeness would fail anyway
+        if not params or not any(
+            params.get(field) is not None for field in RuleValidator._SEARCH_FIELDS_SET
+        ):
+            issues = {}
+            # Unknown fields (e.g. a failed generation's "error message") still get reported,
+            # they are the useful part of the regeneration feedback
+            schema_valid, schema_error = self.rule_validator.rule_schema_validate(params or {})
+            if not schema_valid:
+                issues["rule_schema"] = schema_error
+            issues["rule_completeness"] = RuleValidator._COMPLETENESS_ERROR
+            return {
+                "status": "invalid",
+                "issues": issues
+            }
+        
+        # Layer 1: Rule validators (fast), stop at the first failure since we return on it anyway
+        rule_result = await self.rule_validator.run_validation(params, fail_fast=True)
         
         if rule_result["status"] != "valid":
             # Rule validation failed - return immediately